@@ -1,25 +1,498 @@
+import inspect
+import types
+import weakref
+
+from functools import partial, update_wrapper, wraps
+
+from django.utils.functional import cached_property
+
+# South is optional: only needed to re-memoize patches over functions that
+# South itself memoized.
+try:
+    from south.utils import memoize as _south_memoize
+except ImportError:
+    _south_memoize = None
+
+# Maps a class to a dict of {attribute name: MRO index where it was last
+# found}, so that repeatedly patching the same class costs a single dict
+# probe instead of a full MRO walk. Weak keys so we don't keep classes alive.
+_MRO_HINTS = weakref.WeakKeyDictionary()
+
+# Sentinel for "no value supplied", where None is a legitimate value.
+_MISSING = object()
+
+# Sentinel "original" meaning the patch shadowed an attribute that wasn't
+# in the target's own __dict__, so restoring means deleting our entry.
+_DELETE = object()
+
+# Stack of BatchPatcher objects currently inside their "with" block.
+_ACTIVE_BATCHES = []
+
+def _invalidate_hints(name):
+    # Installing or removing a patch can change where name is found in
+    # any class's MRO (e.g. a wrapper landing in a subclass __dict__ now
+    # shadows the base class the hint points at), so drop every
+    # remembered index for that name.
+    for hints in _MRO_HINTS.values():
+        hints.pop(name, None)
+
+def _apply_write(target, name, value):
+    # The one place attribute writes actually happen, shared by the
+    # unbatched path and BatchPatcher's flush.
+    if value is _DELETE:
+        try:
+            delattr(target, name)
+        except AttributeError:
+            pass # already gone: nothing to undo
+    else:
+        setattr(target, name, value)
+    _invalidate_hints(name)
+
+def _set_patch(target, name, value):
+    """
+    Single choke point for patch writes - both installing a replacement
+    and restoring an original. If a batch_patches() block is active for
+    target, the write is buffered and applied when the block exits (so an
+    apply followed by a restore nets out to the original); otherwise it's
+    an ordinary setattr.
+    """
+    for batch in reversed(_ACTIVE_BATCHES):
+        if batch.class_or_instance is target:
+            batch.pending.append((name, value))
+            return
+    _apply_write(target, name, value)
+    _bump_epoch(target)
+
+# Remembers what (target, method_name) resolved to - the original function
+# and, for a @cached_property, the original descriptor - so that
+# re-patching the same method in a loop skips the MRO walk. Entries are
+# validated against a weak reference (ids can be recycled) and against the
+# target's epoch, which we bump on every attribute write made through this
+# module; writes made behind our back are not detected, same as any cache.
+_RESOLUTION_CACHE = {}
+_RESOLUTION_CACHE_MAX = 1024
+_PATCH_EPOCHS = weakref.WeakKeyDictionary()
+
+def _bump_epoch(target):
+    try:
+        _PATCH_EPOCHS[target] = _PATCH_EPOCHS.get(target, 0) + 1
+    except TypeError:
+        pass # not weakly referenceable or not hashable: never cached
+
+def _resolution_cache_get(target, method_name):
+    entry = _RESOLUTION_CACHE.get((id(target), method_name))
+    if entry is None:
+        return None
+    target_ref, epoch, resolution = entry
+    if target_ref() is not target or epoch != _PATCH_EPOCHS.get(target, 0):
+        del _RESOLUTION_CACHE[(id(target), method_name)]
+        return None
+    return resolution
+
+def _resolution_cache_put(target, method_name, resolution):
+    try:
+        target_ref = weakref.ref(target)
+        epoch = _PATCH_EPOCHS.get(target, 0)
+    except TypeError:
+        return # can't validate an entry for this target, so don't cache
+    if len(_RESOLUTION_CACHE) >= _RESOLUTION_CACHE_MAX:
+        _RESOLUTION_CACHE.clear()
+    _RESOLUTION_CACHE[(id(target), method_name)] = (target_ref, epoch,
+        resolution)
+
+# http://stackoverflow.com/a/3681323/648162
+def _get_dict_attr(obj, attr):
+    """
+    Returns (value, from_instance): from_instance is True when the value
+    came from the instance (or module) __dict__ itself rather than a
+    class along the MRO, which changes how a patch over it must bind and
+    be restored.
+    """
+    if isinstance(obj, type):
+        cls = obj
+    else:
+        # type(obj) is a single C call, cheaper than the __class__
+        # attribute lookup
+        cls = type(obj)
+        # instances (and modules) carry their own __dict__, which
+        # takes precedence over anything found on the class
+        if attr in obj.__dict__:
+            return obj.__dict__[attr], True
+
+    # fast path: we remembered where in the MRO we found this attribute
+    # last time, so verify with a single __dict__ probe
+    hints = _MRO_HINTS.get(cls)
+    if hints is not None and attr in hints:
+        try:
+            return cls.__mro__[hints[attr]].__dict__[attr], False
+        except KeyError:
+            pass # hint went stale, fall back to the full walk
+
+    for index, c in enumerate(cls.__mro__):
+        if attr in c.__dict__:
+            if hints is None:
+                hints = _MRO_HINTS.setdefault(cls, {})
+            hints[attr] = index
+            return c.__dict__[attr], False
+    raise AttributeError("No attribute called %s found in class of %s "
+        "or any superclass" % (attr, obj))
+
+def _make_bound_wrapper(wrapper_function, external_replacement_function,
+    original_function):
+    """
+    Bind wrapper_function to the external replacement and the original
+    function, producing the replacement that actually gets installed.
+
+    When the original has a simple fixed signature (plain positional
+    parameters, no defaults), we generate a wrapper with exactly that
+    signature, so each patched call passes its arguments straight through
+    instead of packing them into a fresh tuple and dict. Anything fancier
+    (defaults, *args, keyword-only parameters, uninspectable builtins)
+    falls back to a plain partial, which behaves identically.
+    """
+    names = _fixed_arity_names(original_function)
+    if names is not None:
+        arglist = ', '.join(names)
+        return _compile_wrapper(
+            "def specialized_wrapper(%s):\n"
+            "    return _wrap(_ext, _orig, %s)\n" % (arglist, arglist),
+            {
+                '_wrap': wrapper_function,
+                '_ext': external_replacement_function,
+                '_orig': original_function,
+            })
+
+    return partial(wrapper_function, external_replacement_function,
+        original_function)
+
+def _fixed_arity_names(original_function):
+    """
+    If original_function has a simple fixed signature (plain positional
+    parameters, no defaults), return its parameter names, ready to become
+    the signature of a generated wrapper. Returns None for anything
+    fancier (defaults, *args, keyword-only parameters, uninspectable
+    builtins), or if a parameter name would collide with the free
+    variables the generated wrappers use.
+    """
+    try:
+        signature = inspect.signature(original_function)
+    except (TypeError, ValueError):
+        return None
+
+    parameters = list(signature.parameters.values())
+    names = [p.name for p in parameters]
+    if (all(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+            and p.default is p.empty for p in parameters)
+        and not set(names) & set(['_wrap', '_ext', '_orig', 'result'])):
+        return names
+    return None
+
+def _compile_wrapper(source, namespace):
+    exec(compile(source, '<monkeypatch>', 'exec'), namespace)
+    return namespace['specialized_wrapper']
+
+def _fuse_after(external_after_function, original_function):
+    """
+    Build the replacement for an after() patch as a single closure, so a
+    patched call runs one wrapper frame instead of a bound-wrapper
+    dispatch plus a wrapper frame. Originals with a simple fixed
+    signature get a generated wrapper with that exact signature, so the
+    arguments pass straight through instead of being packed into a fresh
+    tuple and dict on every call.
+    """
+    names = _fixed_arity_names(original_function)
+    if names is not None:
+        arglist = ', '.join(names)
+        return _compile_wrapper(
+            "def specialized_wrapper(%s):\n"
+            "    result = _orig(%s)\n"
+            "    _ext(%s)\n"
+            "    return result\n" % (arglist, arglist, arglist),
+            {'_ext': external_after_function, '_orig': original_function})
+
+    @wraps(original_function)
+    def fused_after(*args, **kwargs):
+        result = original_function(*args, **kwargs)
+        external_after_function(*args, **kwargs)
+        return result
+    return fused_after
+
+def _fuse_patch(external_patch_function, original_function):
+    """
+    The replacement for a patch() is the external function with the
+    original bound in front of its arguments. For a simple fixed
+    signature we generate a wrapper that does exactly that (and, being a
+    real function, also binds self when installed on a class); otherwise
+    functools.partial does it from C, with no intermediate wrapper frame.
+    """
+    names = _fixed_arity_names(original_function)
+    if names is not None:
+        arglist = ', '.join(names)
+        return _compile_wrapper(
+            "def specialized_wrapper(%s):\n"
+            "    return _ext(_orig, %s)\n" % (arglist, arglist),
+            {'_ext': external_patch_function, '_orig': original_function})
+
+    return partial(external_patch_function, original_function)
+
+def _fuse_modify_return_value(external_modify_function, original_function):
+    """
+    As _fuse_after, for modify_return_value() patches.
+    """
+    names = _fixed_arity_names(original_function)
+    if names is not None:
+        arglist = ', '.join(names)
+        return _compile_wrapper(
+            "def specialized_wrapper(%s):\n"
+            "    return _ext(_orig(%s), %s)\n" % (arglist, arglist, arglist),
+            {'_ext': external_modify_function, '_orig': original_function})
+
+    @wraps(original_function)
+    def fused_modify_return_value(*args, **kwargs):
+        return external_modify_function(
+            original_function(*args, **kwargs), *args, **kwargs)
+    return fused_modify_return_value
+
+def _as_cached_property(function, owner, name):
+    """
+    Wrap function in a fresh cached_property, ready to install on owner
+    under name. Newer cached_property implementations learn their name
+    from __set_name__, which plain setattr after class creation doesn't
+    call, so call it ourselves; older ones read function.__name__, which
+    update_wrapper has already copied from the original.
+    """
+    descriptor = cached_property(function)
+    set_name = getattr(descriptor, '__set_name__', None)
+    if set_name is not None:
+        set_name(owner, name)
+    return descriptor
+
+def _bind_if_instance_method(class_or_instance, method_name,
+    original_function, replacement, from_instance):
+    """
+    When the patch target is a single instance and the original is a real
+    method (a function found on the instance's class), bind the
+    replacement to the instance with types.MethodType. A plain function
+    dropped into the instance __dict__ is not a descriptor, so it would be
+    called without the instance; binding keeps self flowing through and
+    lets CPython's method-call fast path apply. Classes, modules,
+    non-method originals and originals that already sat in the instance
+    __dict__ (which were never bound) are returned unchanged.
+    """
+    if isinstance(class_or_instance, (type, types.ModuleType)):
+        return replacement
+    if from_instance:
+        return replacement
+    if not isinstance(original_function, types.FunctionType):
+        return replacement
+    return types.MethodType(replacement, class_or_instance)
+
+def _prepare_replacement(class_or_instance, method_name, original_function,
+    actual_final_replacement, original_descriptor, from_instance):
+
+    # Make the replacement look like the function it replaces, so
+    # that introspection (and anything keying on __name__ or
+    # following __wrapped__) sees through the patch.
+    update_wrapper(actual_final_replacement, original_function)
+
+    if original_descriptor is not None:
+        # The original was a @cached_property: install a fresh descriptor
+        # with the replacement baked in, so per-instance caching keeps
+        # working without mutating the original descriptor.
+        return _as_cached_property(actual_final_replacement,
+            class_or_instance, method_name)
+
+    if (isinstance(class_or_instance, type)
+        and isinstance(actual_final_replacement, partial)):
+        # partial objects are not descriptors: installed on a class, one
+        # would be called without the instance. Re-wrap in a real function
+        # so self binding still happens; modules and instances keep the
+        # frameless partial.
+        bound_partial = actual_final_replacement
+        @wraps(original_function)
+        def bound_wrapper(*args, **kwargs):
+            return bound_partial(*args, **kwargs)
+        actual_final_replacement = bound_wrapper
+
+    return _bind_if_instance_method(class_or_instance, method_name,
+        original_function, actual_final_replacement, from_instance)
+
+def _install_replacement(class_or_instance, method_name, original_function,
+    actual_final_replacement, original_descriptor, from_instance):
+
+    _set_patch(class_or_instance, method_name, _prepare_replacement(
+        class_or_instance, method_name, original_function,
+        actual_final_replacement, original_descriptor, from_instance))
+
+def _final_decorator_plain(class_or_instance, method_name, original_function,
+    make_replacement, original_descriptor, from_instance,
+    external_replacement_function):
+    """
+    The bound decorator handed out by get_decorator_or_context_object:
+    builds the real replacement around external_replacement_function and
+    activates the patch. Lives at module scope and is bound with partial,
+    so registrations don't rebuild a closure (and its cells) every time.
+    """
+    actual_final_replacement = make_replacement(
+        external_replacement_function, original_function)
+
+    _install_replacement(class_or_instance, method_name, original_function,
+        actual_final_replacement, original_descriptor, from_instance)
+
+    # It's not useful to return the same wrapper, because
+    # that would replace the external_replacement_function with
+    # a decorated version, which would stop it from being used
+    # to replace multiple methods. So we return the
+    # external_replacement_function as it originally was, leaving
+    # it unchanged in its definition.
+    return external_replacement_function
+
+def _final_decorator_memoized(class_or_instance, method_name,
+    original_function, make_replacement, original_descriptor, from_instance,
+    external_replacement_function):
+    """
+    Variant of _final_decorator_plain for originals that South memoized:
+    the replacement is memoized again before being installed.
+    """
+    actual_final_replacement = _south_memoize(make_replacement(
+        external_replacement_function, original_function))
+
+    _install_replacement(class_or_instance, method_name, original_function,
+        actual_final_replacement, original_descriptor, from_instance)
+
+    return external_replacement_function
+
 class TemporaryPatcher(object):
-    def __init__(self, class_or_instance, method_name, replacement_function):
+    # Test suites create thousands of these in "with patch(...)" blocks:
+    # slots keep them to a handful of references with no per-instance
+    # __dict__.
+    __slots__ = ('class_or_instance', 'method_name', 'original_function',
+        'replacement_function', 'apply_now', 'resolution')
+
+    def __init__(self, class_or_instance, method_name, replacement_function,
+        apply_now=True, original_function=_MISSING, resolution=None):
+
         self.class_or_instance = class_or_instance
         self.method_name = method_name
-        self.original_function = getattr(class_or_instance, method_name)
+        if original_function is _MISSING:
+            # The attribute may not exist yet (insert): restore None on
+            # exit in that case, as we always have.
+            original_function = getattr(class_or_instance, method_name, None)
+        self.original_function = original_function
         self.replacement_function = replacement_function
-        
-        # Apply the patch immediately, in case we're not being used in
-        # as context object at all, but just a plain procedure, in which
-        # case __enter__ and __exit__ will never be called.
-        setattr(self.class_or_instance, self.method_name, 
+        self.apply_now = apply_now
+        self.resolution = resolution
+
+        if apply_now:
+            # Apply the patch immediately, in case we're not being used in
+            # as context object at all, but just a plain procedure, in which
+            # case __enter__ and __exit__ will never be called.
+            self.apply()
+
+    def apply(self):
+        _set_patch(self.class_or_instance, self.method_name,
             self.replacement_function)
-         
+
     def __enter__(self):
+        if not self.apply_now:
+            # Deferred from __init__ by the *_ctx helpers, which know they
+            # are only ever used in a "with" statement.
+            self.apply()
         return None # no context variable
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        setattr(self.class_or_instance, self.method_name, 
+        # Through _set_patch, so a revert inside an active batch_patches()
+        # block is buffered along with the apply it undoes.
+        _set_patch(self.class_or_instance, self.method_name,
             self.original_function)
+        if self.resolution is not None:
+            # The revert just put the resolved original back, so the
+            # resolution is current again: re-cache it under the fresh
+            # epoch. Without this, the apply and revert each bump the
+            # epoch and every "with patch(...)" iteration in a loop
+            # would miss and re-walk the MRO.
+            _resolution_cache_put(self.class_or_instance, self.method_name,
+                self.resolution)
+
+class BatchPatcher(object):
+    """
+    Buffers patches applied to one target inside a "with" block and
+    installs them in a single contiguous burst when the block exits.
+
+    On CPython, every setattr on a class invalidates its type version tag
+    and with it every inline attribute cache pointing at the class; N
+    separate patches mean N invalidations, each potentially landing after
+    the caches have been re-warmed. Batching leaves one cold window
+    instead. Note that the buffered patches only take effect when the
+    block exits:
+
+        with batch_patches(MyModel):
+            patch(MyModel, 'save', save_with_audit_trail)
+            patch(MyModel, 'delete', delete_with_audit_trail)
+        # both patches are live from here
+    """
+    __slots__ = ('class_or_instance', 'pending')
+
+    def __init__(self, class_or_instance):
+        self.class_or_instance = class_or_instance
+        self.pending = []
+
+    def __enter__(self):
+        _ACTIVE_BATCHES.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _ACTIVE_BATCHES.remove(self)
+        for name, value in self.pending:
+            _apply_write(self.class_or_instance, name, value)
+        _bump_epoch(self.class_or_instance)
+
+def batch_patches(class_or_instance):
+    """
+    Returns a context object that collects patches made to
+    class_or_instance inside the "with" block and applies them together
+    on exit. See BatchPatcher.
+    """
+    return BatchPatcher(class_or_instance)
+
+class MultiPatcher(object):
+    """
+    Context object over several TemporaryPatchers that restores them all
+    in one loop on exit, newest first, instead of one nested "with" block
+    (and one __exit__ frame) per patch:
+
+        with patches(
+                patch(MyClass, 'save', save_with_audit_trail),
+                after(MyClass, 'delete', log_deletion)):
+            do_something()
+    """
+    __slots__ = ('patchers',)
+
+    def __init__(self, patchers):
+        self.patchers = patchers
+
+    def __enter__(self):
+        for patcher in self.patchers:
+            if not patcher.apply_now:
+                # came from patch_ctx/after_ctx: apply on entry
+                patcher.apply()
+        return None # no context variable
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for patcher in reversed(self.patchers):
+            patcher.__exit__(exc_type, exc_val, exc_tb)
+
+def patches(*patchers):
+    """
+    Bundles the given TemporaryPatchers (the results of procedural
+    patch/after/insert/modify_return_value calls) into a single context
+    object for a "with" statement. See MultiPatcher.
+    """
+    return MultiPatcher(patchers)
 
 def get_decorator_or_context_object(class_or_instance, method_name,
-    wrapper_function, external_replacement_function=None):
+    wrapper_function, external_replacement_function=None,
+    _original_override=_MISSING, _apply_now=True, _replacement_factory=None):
     """
     This is really confusing, but helps reduce code duplication. You have
     been warned: be prepared for head-spinning.
@@ -77,43 +550,71 @@ def get_decorator_or_context_object(class_or_instance, method_name,
     (2) the original_function, that was replaced by the monkey patch.
     """
 
-    # http://gnosis.cx/publish/programming/metaclass_2.txt
-    def get_obj_mro(obj):
-        if isinstance(obj, type):
-            return obj.mro()
+    if _original_override is _MISSING:
+        resolution = _resolution_cache_get(class_or_instance, method_name)
+        if resolution is not None:
+            # This exact target was resolved before and nothing has been
+            # patched on it since: skip the MRO walk entirely. Test suites
+            # doing "with patch(SomeClass, 'method', fn)" in a loop hit
+            # this every iteration after the first.
+            original_function, original_descriptor, from_instance = resolution
         else:
-            return obj.__class__.mro()
-        
-    # http://stackoverflow.com/a/3681323/648162
-    def get_dict_attr(obj, attr):
-        for c in [obj] + get_obj_mro(obj):
-            if attr in c.__dict__:
-                return c.__dict__[attr]
-        raise AttributeError("No attribute called %s found in class of %s "
-            "or any superclass" % (attr, obj))
-
-    original_function = get_dict_attr(class_or_instance, method_name)
-
-    # if original_function is a @cached_property, then trying to read it
-    # will result in a call to __get__ which will execute the function
-    # to cache the property, which is not what we want at all! To fix that,
-    # we check for things that look like @cached_property and patch their
-    # 'func' attribute instead
-
-    from django.utils.functional import cached_property
-    if isinstance(original_function, cached_property):
-        class_or_instance = original_function
-        original_function = original_function.func
-        method_name = 'func'
+            original_function, from_instance = _get_dict_attr(
+                class_or_instance, method_name)
+
+            # if original_function is a @cached_property, then trying to
+            # read it via getattr would call __get__ and execute the
+            # function to cache the property, which is not what we want at
+            # all! So we keep hold of the descriptor, wrap its bare 'func',
+            # and later install a fresh descriptor around the replacement,
+            # leaving the original descriptor untouched.
+
+            if isinstance(original_function, cached_property):
+                original_descriptor = original_function
+                original_function = original_function.func
+            else:
+                original_descriptor = None
+
+            _resolution_cache_put(class_or_instance, method_name,
+                (original_function, original_descriptor, from_instance))
+    else:
+        # The caller (insert) knows there is nothing to look up, and
+        # supplies a stand-in original instead, so we don't have to write
+        # a placeholder attribute just to read it back.
+        original_function = _original_override
+        original_descriptor = None
+        from_instance = False
+
+    if (original_descriptor is not None and not from_instance
+        and not isinstance(class_or_instance, (type, types.ModuleType))):
+        # A cached_property lives on a class even when the caller handed
+        # us an instance: a descriptor written into the instance __dict__
+        # never fires __get__, so both the patched reads and the restored
+        # original would evaluate to the descriptor object itself.
+        # Retarget the patch at the class that actually holds it.
+        for c in type(class_or_instance).__mro__:
+            if c.__dict__.get(method_name) is original_descriptor:
+                class_or_instance = c
+                break
+        else:
+            class_or_instance = type(class_or_instance)
 
     # If it looks like it was memoized by South, then we can't access the real
     # original function as it's hidden by a closure, so we just memoize the
     # replacement instead.
-    memoize_the_replacement = False
-    if hasattr(original_function, '__name__') and \
-        hasattr(original_function, '_invalidate'):
+    memoize_the_replacement = (
+        getattr(original_function, '_invalidate', None) is not None
+        and hasattr(original_function, '__name__'))
+    # _invalidate is set by South's memoize, so South must be importable
+    assert not memoize_the_replacement or _south_memoize is not None
 
-        memoize_the_replacement = True
+    # Monkeypatch helpers whose wrapper can be fused with the original into
+    # a single closure (after, modify_return_value) supply a factory;
+    # everyone else gets the generic wrapper_function binding.
+    if _replacement_factory is None:
+        make_replacement = partial(_make_bound_wrapper, wrapper_function)
+    else:
+        make_replacement = _replacement_factory
    
     if external_replacement_function is None:
         # The monkeypatch function (not this one) is being used as an
@@ -128,35 +629,11 @@ def get_decorator_or_context_object(class_or_instance, method_name,
         # The monkeypatch function returns this bound decorator to its
         # caller, where it's applied to the external replacement function.
 
-        def final_decorator(external_replacement_function):
-            # Activate the patch now
-            actual_final_replacement = curry(wrapper_function,
-                external_replacement_function, original_function)
-
-            if memoize_the_replacement:
-                from south.utils import memoize
-                actual_final_replacement = memoize(actual_final_replacement)
-
-            setattr(class_or_instance, method_name, actual_final_replacement)
-
-            # Note: by now, class_or_instance is the original function, not the
-            # class or module that it's a member of.
-            if isinstance(class_or_instance, cached_property):
-                # Rename so that cached_property's assignment to
-                # instance.__dict__[self.func.__name__] does actually replace
-                # the cached_property object with the result of the function
-                # call, and the property is actually cached.
-                actual_final_replacement.__name__ = original_function.__name__
-
-            # It's not useful to return the same wrapper, because
-            # that would replace the external_replacement_function with
-            # a decorated version, which would stop it from being used
-            # to replace multiple methods. So we return the
-            # external_replacement_function as it originally was, leaving
-            # it unchanged in its definition.
-            return external_replacement_function
-       
-        return final_decorator
+        return partial(
+            _final_decorator_memoized if memoize_the_replacement
+                else _final_decorator_plain,
+            class_or_instance, method_name, original_function,
+            make_replacement, original_descriptor, from_instance)
     else:
         # Being used as a context object or procedural call.
         # The monkeypatch function returns this TemporaryPatcher to its
@@ -164,20 +641,48 @@ def get_decorator_or_context_object(class_or_instance, method_name,
         # import pdb; pdb.set_trace()
 
         if memoize_the_replacement:
-            from south.utils import memoize
-            external_replacement_function = memoize(external_replacement_function)
+            external_replacement_function = _south_memoize(
+                external_replacement_function)
 
         # If the replacement is a callable, then curry it so that it receives
         # original_function as its first argument.
-        if hasattr(external_replacement_function, '__call__'):
+        # For a cached property, restore the original descriptor on exit
+        # rather than whatever getattr would execute. For an instance patch
+        # over a method inherited from the class, restore by deleting our
+        # instance attribute: writing a bound method back into the instance
+        # __dict__ would shadow the class method with a frozen copy.
+        if original_descriptor is not None:
+            restore = original_descriptor
+        elif (_original_override is _MISSING and not from_instance
+            and not isinstance(class_or_instance, (type, types.ModuleType))):
+            restore = _DELETE
+        else:
+            restore = _MISSING
+
+        # Every restore variant puts the resolved original back, so the
+        # TemporaryPatcher can re-cache the resolution when it reverts -
+        # except for insert's stand-in original, which was never resolved.
+        if _original_override is _MISSING:
+            resolution = (original_function, original_descriptor,
+                from_instance)
+        else:
+            resolution = None
+
+        if callable(external_replacement_function):
+            actual_final_replacement = _prepare_replacement(
+                class_or_instance, method_name, original_function,
+                make_replacement(external_replacement_function,
+                    original_function),
+                original_descriptor, from_instance)
             return TemporaryPatcher(class_or_instance, method_name,
-                curry(wrapper_function, external_replacement_function,
-                    original_function))
+                actual_final_replacement, apply_now=_apply_now,
+                original_function=restore, resolution=resolution)
         else:
             # Otherwise, it's a plain value, which will never be called and
             # has no way to use an original function if it bit it in the ass.
             return TemporaryPatcher(class_or_instance, method_name,
-                external_replacement_function)
+                external_replacement_function, apply_now=_apply_now,
+                original_function=restore, resolution=resolution)
 
 def before(target_class_or_module, target_method_name):
     """
@@ -202,6 +707,7 @@ def before(target_class_or_module, target_method_name):
     # TODO convert to use get_decorator_or_context_object, like the others.
     original_function = getattr(target_class_or_module, target_method_name)
     def decorator(before_function):
+        @wraps(original_function)
         def wrapper_with_before(*args, **kwargs):
             before_function(*args, **kwargs)
             return original_function(*args, **kwargs)
@@ -211,6 +717,13 @@ def before(target_class_or_module, target_method_name):
     return decorator
 
 
+def _wrapper_with_after(external_after_function, original_function,
+    *args, **kwargs):
+
+    result = original_function(*args, **kwargs)
+    external_after_function(*args, **kwargs)
+    return result
+
 def after(class_or_instance, method_name, bare_replacement_function=None):
     """
     This decorator generator takes two arguments, a class or module to
@@ -227,16 +740,29 @@ def after(class_or_instance, method_name, bare_replacement_function=None):
     is retained for you and you don't have to worry about it.
     """
     
-    def wrapper_with_after(external_after_function, original_function,
-        *args, **kwargs):
-        
-        result = original_function(*args, **kwargs)
-        external_after_function(*args, **kwargs)
-        return result
     return get_decorator_or_context_object(class_or_instance, method_name,
-        wrapper_with_after, bare_replacement_function)
+        _wrapper_with_after, bare_replacement_function,
+        _replacement_factory=_fuse_after)
+
+def after_ctx(class_or_instance, method_name, bare_replacement_function):
+    """
+    Like after() used procedurally, but strictly for use in a "with"
+    statement: the patch is applied on entering the block rather than
+    immediately, so a temporary patch costs two setattr calls on the
+    target (apply and revert) instead of three.
+    """
+    return get_decorator_or_context_object(class_or_instance, method_name,
+        _wrapper_with_after, bare_replacement_function, _apply_now=False,
+        _replacement_factory=_fuse_after)
 
-from django.utils.functional import curry
+
+def _wrapper_with_patch(external_patch_function, original_function,
+    *args, **kwargs):
+    """
+    external_patch_function is the supplied patch, which takes
+    original_function as its first argument.
+    """
+    return external_patch_function(original_function, *args, **kwargs)
 
 def patch(class_or_instance, method_name, bare_replacement_function=None):
     """
@@ -298,16 +824,20 @@ def patch(class_or_instance, method_name, bare_replacement_function=None):
     This will automatically undo the patch when the "with" block exits.
     """
 
-    def wrapper_with_patch(external_patch_function, original_function,
-        *args, **kwargs):
-        """
-        external_patch_function is the supplied patch, which takes
-        original_function as its first argument.
-        """
-        return external_patch_function(original_function, *args, **kwargs)
-    
     return get_decorator_or_context_object(class_or_instance, method_name,
-        wrapper_with_patch, bare_replacement_function)
+        _wrapper_with_patch, bare_replacement_function,
+        _replacement_factory=_fuse_patch)
+
+def patch_ctx(class_or_instance, method_name, bare_replacement_function):
+    """
+    Like patch() used procedurally, but strictly for use in a "with"
+    statement: the patch is applied on entering the block rather than
+    immediately, so a temporary patch costs two setattr calls on the
+    target (apply and revert) instead of three.
+    """
+    return get_decorator_or_context_object(class_or_instance, method_name,
+        _wrapper_with_patch, bare_replacement_function, _apply_now=False,
+        _replacement_factory=_fuse_patch)
 
 def insert(class_or_instance, method_name, bare_inserted_function=None):
     """
@@ -368,16 +898,16 @@ def insert(class_or_instance, method_name, bare_inserted_function=None):
         """
         return external_patch_function(*args, **kwargs)
     
-    if method_name in dir(class_or_instance):
+    if hasattr(class_or_instance, method_name):
         raise KeyError("%s.%s already exists, refusing to overwrite it" %
-            class_or_instance, method_name)
-    # ensure that class_or_instance.method_name exists so that 
-    # get_decorator_or_context_object() doesn't throw an error when trying
-    # to curry it.
-    setattr(class_or_instance, method_name, None)
-    
+            (class_or_instance, method_name))
+    # class_or_instance.method_name doesn't exist, so pass a do-nothing
+    # original through instead of writing a placeholder attribute first:
+    # every setattr on a class invalidates CPython's type version tag and
+    # with it every inline attribute cache pointing at that class.
     return get_decorator_or_context_object(class_or_instance, method_name,
-        wrapper_with_insert, bare_inserted_function)
+        wrapper_with_insert, bare_inserted_function,
+        _original_override=lambda *args, **kwargs: None)
 
 def breakpoint(*args, **kwargs):
     import pdb; pdb.set_trace()
@@ -424,4 +954,5 @@ def modify_return_value(class_or_instance, method_name,
         result = external_modify_function(result, *args, **kwargs)
         return result
     return get_decorator_or_context_object(class_or_instance, method_name,
-        wrapper_with_modify, bare_replacement_function)
+        wrapper_with_modify, bare_replacement_function,
+        _replacement_factory=_fuse_modify_return_value)